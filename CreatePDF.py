@@ -1,23 +1,25 @@
 #!/usr/bin/env python3
 import argparse
+import io
+import os
 import re
 from pathlib import Path
 
-from PIL import Image
-import matplotlib.pyplot as plt
-from matplotlib.backends.backend_pdf import PdfPages
+import img2pdf
+from PIL import Image, ImageDraw, ImageFont
 
 
 SL_DIR_RE = re.compile(r"^SL(\d+)$")
 SEC_FILE_RE = re.compile(r"^sec(\d+)\.(png|jpg|jpeg)$", re.IGNORECASE)
+IMAGE_EXTS = (".png", ".jpg", ".jpeg")
 
 
-def natural_key_dir(p: Path):
+def natural_key_dir(p: os.DirEntry):
     m = SL_DIR_RE.match(p.name)
     return (int(m.group(1)) if m else 10**9, p.name.lower())
 
 
-def natural_key_file(p: Path):
+def natural_key_file(p: os.DirEntry):
     m = SEC_FILE_RE.match(p.name)
     return (int(m.group(1)) if m else 10**9, p.name.lower())
 
@@ -26,40 +28,79 @@ def collect_images(base_dir: Path):
     """
     Return a list of tuples (folder_name, image_path) sorted by SL#, then sec#.
     """
+    sl_match = SL_DIR_RE.match
+    sec_match = SEC_FILE_RE.match
+
+    # DirEntry.is_dir()/is_file() reuse the file type from the listing, no stat per entry
+    with os.scandir(base_dir) as it:
+        sl_dirs = [e for e in it if e.is_dir() and sl_match(e.name)]
+
     images = []
-    for sl_dir in sorted([d for d in base_dir.iterdir() if d.is_dir() and SL_DIR_RE.match(d.name)],
-                         key=natural_key_dir):
-        for img in sorted([p for p in sl_dir.iterdir() if p.is_file() and SEC_FILE_RE.match(p.name)],
-                          key=natural_key_file):
-            images.append((sl_dir.name, img))
+    for sl_dir in sorted(sl_dirs, key=natural_key_dir):
+        with os.scandir(sl_dir.path) as it:
+            # Cheap prefix/suffix checks first; the regex only confirms the sec number
+            files = [f for f in it
+                     if f.name[:3].lower() == "sec" and f.name.lower().endswith(IMAGE_EXTS)
+                     and f.is_file() and sec_match(f.name)]
+        for img in sorted(files, key=natural_key_file):
+            images.append((sl_dir.name, Path(img.path)))
     return images
 
 
+# Image pixels per inch on the page
+PDF_DPI = 150
+
+
+def title_font(size: int):
+    try:
+        return ImageFont.truetype("DejaVuSans.ttf", size)
+    except OSError:
+        return ImageFont.load_default()
+
+
+def make_page(img_path: Path, title: str) -> Image.Image:
+    """
+    Return the image as an RGB page with the title drawn in a white band above it.
+    """
+    with Image.open(img_path) as im:
+        im = im.convert("RGB")
+
+    font_size = max(12, im.width // 60)
+    band = 2 * font_size
+    page = Image.new("RGB", (im.width, im.height + band), "white")
+    page.paste(im, (0, band))
+
+    draw = ImageDraw.Draw(page)
+    font = title_font(font_size)
+    left, top, right, bottom = draw.textbbox((0, 0), title, font=font)
+    draw.text(((im.width - (right - left)) / 2 - left, (band - (bottom - top)) / 2 - top),
+              title, fill="black", font=font)
+    return page
+
+
+def page_png(img_path: Path, title: str) -> bytes:
+    # The titled page as PNG bytes: PNG is lossless and img2pdf embeds it as is
+    buf = io.BytesIO()
+    make_page(img_path, title).save(buf, "PNG")
+    return buf.getvalue()
+
+
 def make_pdf(images, output_pdf: Path):
     if not images:
         raise SystemExit("No matching images found. Expected SL*/sec*.png under the base directory.")
 
     output_pdf.parent.mkdir(parents=True, exist_ok=True)
 
-    with PdfPages(output_pdf) as pdf:
-        for folder_name, img_path in images:
-            # Load image
-            with Image.open(img_path) as im:
-                # Create a page
-                fig = plt.figure(figsize=(8.5, 11), dpi=150)
-                ax = fig.add_subplot(111)
-                ax.imshow(im)
-                ax.axis("off")
-
-                # Title with folder and file name
-                title = f"{folder_name} / {img_path.name}"
-                ax.set_title(title, pad=16)
-
-                pdf.savefig(fig, bbox_inches="tight")
-                plt.close(fig)
+    # Title with folder and file name on every page; img2pdf embeds the PNG pages
+    # losslessly (PIL's PDF writer would store them as JPEG). Only the compressed
+    # PNG bytes are kept until the PDF is written, not the decoded pages.
+    pages = [page_png(img_path, f"{folder_name} / {img_path.name}") for folder_name, img_path in images]
+    layout = img2pdf.get_fixed_dpi_layout_fun((PDF_DPI, PDF_DPI))
+    with open(output_pdf, "wb") as f:
+        img2pdf.convert(pages, layout_fun=layout, outputstream=f)
 
 
-def main():
+def main(argv=None):
     parser = argparse.ArgumentParser(
         description="Create a PDF with one image per page from SL*/sec*.png layout."
     )
@@ -75,7 +116,7 @@ def main():
         default=Path("combined_plots.pdf"),
         help="Output PDF file path (default: combined_plots.pdf).",
     )
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
 
     images = collect_images(args.base_dir)
     make_pdf(images, args.output)
@@ -2,13 +2,25 @@
 # coding: utf-8
 
 import ROOT
+import numpy as np
 import pandas as pd
 import os
 import argparse
 import re
-import glob
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 
-def prepare_output_folder(input_path, base_output_dir):
+# Canvases are only printed to files, so never open a display; skip Info messages
+ROOT.gROOT.SetBatch(True)
+ROOT.gErrorIgnoreLevel = ROOT.kWarning
+
+try:
+    from numba import njit
+except ImportError:  # numba is optional, the filters then run as plain Python
+    def njit(*args, **kwargs):
+        return lambda func: func
+
+def run_output_dir(input_path, base_output_dir):
     # Extract the filename
     filename = os.path.basename(input_path)  # e.g., rec_clas_020139.root
 
@@ -18,27 +30,20 @@ def prepare_output_folder(input_path, base_output_dir):
         raise ValueError(f"No numeric identifier found in input file: {filename}")
 
     run_number = match.group(1)
+    return os.path.join(base_output_dir, run_number)
 
+def completion_stamp(input_path, base_output_dir):
+    # Written by main() once every SuperLayer job (plots and CSVs) has returned
+    return os.path.join(run_output_dir(input_path, base_output_dir), 'GetStatus.done')
+
+def prepare_output_folder(input_path, base_output_dir):
     # Create full output path
-    full_output_dir = os.path.join(base_output_dir, run_number)
+    full_output_dir = run_output_dir(input_path, base_output_dir)
     if not os.path.exists(full_output_dir):
         os.makedirs(full_output_dir)
 
     return full_output_dir
 
-# Argument parsing
-parser = argparse.ArgumentParser(description="ROOT histogram processing")
-parser.add_argument("--input", required=True, help="Path to the input ROOT file")
-parser.add_argument("--output", required=True, help="Output directory for plots and CSVs")
-args = parser.parse_args()
-
-# Use these variables in place of hardcoded paths
-# Open input file
-histFileData = ROOT.TFile.Open(args.input, "READ")
-
-# Prepare structured output folder
-output_dir = prepare_output_folder(args.input, args.output)
-
 # Plot styling functions
 def setMarginsTitlesSize(h):
     h.GetXaxis().SetTitleSize(0.04)
@@ -89,72 +94,46 @@ def readSLS(file, name, out):
     for sec in range(6):
         out.append([[file.Get(f'{folder}{name}_S{sec}_SL{sl}_L{lay}') for lay in range(6)] for sl in range(6)])
 
-def ensure_dir(path):
-    if not os.path.exists(path):
-        os.makedirs(path)
+# NumPy dtype of the bin-content array behind each histogram class
+TH1_DTYPES = {'TH1F': np.float32, 'TH1D': np.float64}
 
+def th1_view(h):
+    # Zero-copy NumPy view of the histogram's bin contents, index = bin number
+    # (includes the under/overflow cells). Call h.ResetStats() after writing to it.
+    n = h.GetNbinsX()
+    return np.frombuffer(h.GetArray(), dtype=TH1_DTYPES[h.ClassName()], count=n + 2)
+
+def th1_arrays(h):
+    # Bin centers and contents (without under/overflow) as NumPy arrays
+    n = h.GetNbinsX()
+    axis = h.GetXaxis()
+    xmin, xmax = axis.GetXmin(), axis.GetXmax()
+    x = xmin + (np.arange(n) + 0.5) * ((xmax - xmin) / n)
+    return x, th1_view(h)[1:-1]
+
+def ensure_dir(path):
+    os.makedirs(path, exist_ok=True)
 
-def fit_clone(func_base, name):
-    # Create the new TF1 using the known formula string
-    formula = func_base.GetTitle()  # like "pol3"
-    f = ROOT.TF1(name, formula, func_base.GetXmin(), func_base.GetXmax())
 
-    # SAFELY copy parameters
+def fit_params(func_base):
+    # Describe a fitted TF1 as (formula, parameters, xmin, xmax)
     npar = func_base.GetNpar()
-    for i in range(npar):
-        param = func_base.GetParameter(i)
-        f.SetParameter(i, param)
-        f.SetParError(i, func_base.GetParError(i))  # optional
-        #print(f"Copying param[{i}] = {param}")
-
-    return f
-
-
-####################################################################
-
-for iSL in range(6):
-  out_dir = f'{output_dir}/results/SL{iSL + 1}'
-  ensure_dir(out_dir)
-  
-  # Delete all CSV files in the folder
-  for file_path in glob.glob(os.path.join(out_dir, "*.csv")):
-      try:
-          os.remove(file_path)
-          print(f"Deleted old file: {file_path}")
-      except OSError as e:
-          print(f"Error deleting {file_path}: {e}")
-
-####################################################################
-
-# Load and plot avgWireSummed histograms
-aveWireSum = []
-readHistS(histFileData, 'avgWireSummed', aveWireSum, suffix='_SL')
-
-canvas = ROOT.TCanvas("c2", "c2", 2500, 1200)
-canvas.Divide(3, 2, 0.0001, 0.0001)
-
-for iS, hist in enumerate(aveWireSum):
-    canvas.cd(iS + 1)
-    # Force minimum content for bins > 109
-    for iXbin in range(110, hist.GetNbinsX() + 1):
-        if hist.GetBinContent(iXbin) < 10:
-            hist.SetBinContent(iXbin, 10)
-    setHistParam1D(hist, color=4)
-    hist.SetTitle(f'         Sum All Sec, SupLay {iS + 1}')
-    hist.Draw()
-
-ensure_dir(f"{output_dir}/plots")
-canvas.Print(f"{output_dir}/plots/avgWireSum.png", 'png')
-
-# Load and plot avgWire histograms for each sector & superlayer
-avgWire = []
-readHistSandSL(histFileData, 'avgWire', avgWire)
+    params = np.array([func_base.GetParameter(i) for i in range(npar)])
+    return func_base.GetTitle(), params, func_base.GetXmin(), func_base.GetXmax()
+
+def draw_fit(func, params):
+    # Draw a copy of func with the given parameters on the current pad,
+    # so one TF1 per fit piece serves all pads
+    func.SetParameters(params)
+    func.DrawCopy("same")
+
 
 # --- Accuracy thresholds ---
 accuracy = 15
 minBorder = 1 - accuracy / 100
 maxBorder = 1 + 1.2 * accuracy / 100
 
+
 # --- Polynomial function definitions ---
 def GetPol3_value(x, p0, p1, p2, p3):
     return p0 + x * p1 + x * x * p2 + x * x * x * p3
@@ -162,6 +141,49 @@ def GetPol3_value(x, p0, p1, p2, p3):
 def GetPol1hyperb_value(x, p0, p1, p2):
     return p0 + x * p1 + p2 / x
 
+def piecewise_fit(x, ends, p1, p2, p3, p4):
+    # Evaluate pol3 (p1, p2, p3) and pol1+hyperbola (p4) pieces on sorted bin centers,
+    # switching to the next piece once x > ends[i]
+    i1, i2, i3 = np.searchsorted(x, ends, side='right')
+    fit = np.empty_like(x)
+    fit[:i1] = GetPol3_value(x[:i1], *p1)
+    fit[i1:i2] = GetPol3_value(x[i1:i2], *p2)
+    fit[i2:i3] = GetPol3_value(x[i2:i3], *p3)
+    fit[i3:] = GetPol1hyperb_value(x[i3:], *p4[:3])
+    return fit
+
+# --- Least-squares fits, equivalent to TH1::Fit with options 'WR': unit weights,
+# empty bins skipped, only bins with centers inside [xmin, xmax] ---
+def enough_points(mask, npar, xmin, xmax):
+    # Like a failed TH1::Fit, too few filled bins only warn; the caller then uses zero parameters
+    n = np.count_nonzero(mask)
+    if n < npar:
+        print(f"Warning: {n} filled bins in [{xmin}, {xmax}] for a {npar}-parameter fit, using zero parameters")
+        return False
+    return True
+
+def fit_pol3(x, y, xmin, xmax):
+    mask = (x >= xmin) & (x <= xmax) & (y != 0)
+    if not enough_points(mask, 4, xmin, xmax):
+        return np.zeros(4)
+    coef = np.polyfit(x[mask], y[mask].astype(np.float64), 3)
+    return np.ascontiguousarray(coef[::-1])  # p0 + p1*x + ..., as in ROOT
+
+def fit_pol1hyperb(x, y, xmin, xmax):
+    mask = (x >= xmin) & (x <= xmax) & (y != 0)
+    if not enough_points(mask, 3, xmin, xmax):
+        return np.zeros(3)
+    xs = x[mask]
+    design = np.column_stack([np.ones_like(xs), xs, 1 / xs])
+    return np.linalg.lstsq(design, y[mask].astype(np.float64), rcond=None)[0]
+
+def attach_fit(hist, func):
+    # Store a copy of func with the histogram, as Fit(..., '+') does, so it is drawn with it
+    clone = func.Clone()
+    ROOT.SetOwnership(clone, False)
+    hist.GetListOfFunctions().Add(clone)
+
+
 # --- Fit subranges for each SuperLayer ---
 startG1fit = [0, 0, 0, 0, 0, 5]
 endG1fit   = [7, 7, 7, 9, 9, 14]
@@ -172,135 +194,6 @@ endG3fit   = [75, 75, 75, 90, 75, 80]
 startG4fit = [75, 75, 75, 90, 75, 80]
 maxWireFit = 114
 
-# --- Containers ---
-histDiff = []
-g1_sec, g2_sec, g3_sec, g4_sec = [], [], [], []
-
-# --- Fit and filter wires by SuperLayer ---
-for iSL in range(6):
-    c2 = ROOT.TCanvas(f"c2_{iSL}", "Canvas", 2500, 1000)
-    c2.Divide(4, 2, 0.0001, 0.0001)
-    histDiff.append([])
-
-    # Sum histogram and fitting
-    histSum = aveWireSum[iSL]
-    c2.cd(8)
-    setHistParam1D(histSum, 115)
-    histSum.SetTitle(f'     avgWire Sum, SupLay {iSL + 1}')
-
-    g1 = ROOT.TF1("g1", "pol3", startG1fit[iSL], endG1fit[iSL])
-    g2 = ROOT.TF1("g2", "pol3", startG2fit[iSL], endG2fit[iSL])
-    g3 = ROOT.TF1("g3", "pol3", startG3fit[iSL], endG3fit[iSL])
-    g4 = ROOT.TF1("g4", "[0] + [1]*x + [2]/x", startG4fit[iSL], maxWireFit)
-
-    histSum.Fit(g1, 'WQR')
-    histSum.Fit(g2, 'WQR+')
-    histSum.Fit(g3, 'WQR+')
-    histSum.Fit(g4, 'WQR+')
-
-    # Per sector fits
-    g1_sec.append([]); g2_sec.append([]); g3_sec.append([]); g4_sec.append([])
-
-    histSum.Draw()
-
-    for sec in range(6):
-        pad = sec + 1 if sec < 3 else sec + 2
-        c2.cd(pad)
-
-        hist = avgWire[sec][iSL]
-        fullName = f'fitDiffS{sec}_SL{iSL}'
-        hdiff = ROOT.TH1D(fullName, fullName, hist.GetNbinsX(), hist.GetXaxis().GetXmin(), hist.GetXaxis().GetXmax())
-        histDiff[-1].append(hdiff)
-
-        setHistParam1D(hist, 4)
-        hist.SetTitle(f'          avgWire Sec {sec + 1}, SupLay {iSL + 1}')
-
-
-
-        fit_integral = histSum.Integral(startG1fit[iSL], maxWireFit)
-        hist_integral = hist.Integral(startG1fit[iSL], maxWireFit)
-        norm = hist_integral / fit_integral if fit_integral > 0 else 0
-
-      
-
-        g1f = fit_clone(g1, "g1_sec_SL" + str(iSL) + '_S'+ str(sec))
-        g2f = fit_clone(g2, "g2_sec_SL" + str(iSL) + '_S'+ str(sec))
-        g3f = fit_clone(g3, "g3_sec_SL" + str(iSL) + '_S'+ str(sec))
-        g4f = fit_clone(g4, "g4_sec_SL" + str(iSL) + '_S'+ str(sec))
-      
-
-
-      
-        for f in [g1f, g2f, g3f, g4f]:
-            for i in range(f.GetNpar()):
-                f.SetParameter(i, f.GetParameter(i) * norm)
-
-        g1_sec[-1].append(g1f)
-        g2_sec[-1].append(g2f)
-        g3_sec[-1].append(g3f)
-        g4_sec[-1].append(g4f)
-      
-
-        # Loop over bins to filter wires
-        for iBin in range(1, hist.GetNbinsX() + 1):
-            x = hist.GetBinCenter(iBin)
-            y = hist.GetBinContent(iBin)
-
-            if x <= endG1fit[iSL]:
-                fit_val = GetPol3_value(x, *[g1f.GetParameter(i) for i in range(4)])
-            elif x <= endG2fit[iSL]:
-                fit_val = GetPol3_value(x, *[g2f.GetParameter(i) for i in range(4)])
-            elif x <= endG3fit[iSL]:
-                fit_val = GetPol3_value(x, *[g3f.GetParameter(i) for i in range(4)])
-            else:
-                fit_val = GetPol1hyperb_value(x, *[g4f.GetParameter(i) for i in range(3)])
-
-            if (minBorder * fit_val < y < maxBorder * fit_val and 15 <= x < 107) or x < 15 or x >= 107:
-                histDiff[-1][-1].SetBinContent(iBin, y)
-
-        # Draw
-        hist.SetFillColor(2)
-        hist.SetAxisRange(0, 115, 'x')
-        hist.Draw()
-        
-        histDiff[-1][-1].SetFillColor(9)
-        histDiff[-1][-1].Draw("same")
-        
-        g1_sec[-1][-1].Draw("same")
-        g2_sec[-1][-1].Draw("same")
-        g3_sec[-1][-1].Draw("same")
-        g4_sec[-1][-1].Draw("same")
-        
-    ensure_dir(f'{output_dir}/SupLayers')
-  
-    filename = f"{output_dir}/SupLayers/SLnew{iSL + 1}.png"
-    c2.Print(filename)
-
-    #c2.Print(f'{output_dir}/SupLayers/SLnew{iSL + 1}.png')
-
-
-
-
-
-
-####################################################################
-
-
-
-# Overlay plots and save integrated view per SuperLayer
-canvas = ROOT.TCanvas("c2", "c2", 2000, 600)
-canvas.Divide(3, 2, 0.0001, 0.0001)
-for iSL in range(6):
-    canvas.cd(iSL + 1)
-    hist = aveWireSum[iSL]
-    setHistParam1D(hist, 9)
-    hist.SetLineWidth(3)
-    hist.SetAxisRange(0, 114, 'x')
-    hist.Draw()
-  
-ensure_dir(f"{output_dir}/plots")
-canvas.Print(f"{output_dir}/plots/avgWireInt.png")
-
 # --- Thresholds for layer-level accuracy ---
 accuracyLayLow = 42
 accuracyLayHigh = 150
@@ -310,30 +203,94 @@ minBorderLay = 1 - accuracyLayLow / 100
 minBorderLay_Mid = 1 - accuracyLayLow_Mid / 100
 maxBorderLay = 1 + accuracyLayHigh / 100
 
-# --- Load 2D histograms and detailed layer wire distributions ---
-layVScomp_SL_L, layVScomp_SL_R = [], []
-readHistSandSL(histFileData, 'layVScomp_leftSL', layVScomp_SL_L)
-readHistSandSL(histFileData, 'layVScomp_rightSL', layVScomp_SL_R)
-
-layersSLS = []
-readSLS(histFileData, 'wireINlayer', layersSLS)
-
-# --- Containers for fits and filtered results ---
-g1_lay, g2_lay, g3_lay, g4_lay = [], [], [], []
-histDiffSecLay = []
-
-# --- Main filtering loop ---
-for iSL in range(6):
-    g1_lay.append([]); g2_lay.append([]); g3_lay.append([]); g4_lay.append([])
-    histDiffSecLay.append([])
+@njit(cache=True)
+def filter_layer(x, y, p1, p2, p3, p4, startG2, startG3, startG4, minLo, minMid, maxHi):
+    # Keep bins consistent with the layer fit and suppress single-bin spikes.
+    # Returns the filtered contents indexed by bin number (with under/overflow cells).
+    n = len(y)
+    out = np.zeros(n + 2)
+    prev1, prev2 = 0.0, 0.0
+    for iBin in range(1, n + 1):
+        xb = x[iBin - 1]
+        yb = y[iBin - 1]
+
+        # Select function by wire range
+        if xb <= startG2:
+            fit_val = p1[0] + xb * p1[1] + xb * xb * p1[2] + xb * xb * xb * p1[3]
+        elif xb <= startG3:
+            fit_val = p2[0] + xb * p2[1] + xb * xb * p2[2] + xb * xb * xb * p2[3]
+        elif xb <= startG4:
+            fit_val = p3[0] + xb * p3[1] + xb * xb * p3[2] + xb * xb * xb * p3[3]
+        else:
+            fit_val = p4[0] + xb * p4[1] + p4[2] / xb
+
+        maxMid = 2.0 * maxHi * fit_val
+        # Upper bound for bins 75..99: with a vanishing fit only bins > 98 keep y < 1
+        maxTail = maxMid if maxMid != 0 else (1.0 if iBin > 98 else 0.0)
+
+        keep = (
+            (iBin < 12 and yb < maxHi * fit_val and yb > minLo * fit_val) or iBin < 4 or iBin > 105
+            or (iBin >= 12 and iBin < 75 and yb < maxMid and yb > minMid * fit_val)
+            or (iBin >= 75 and iBin < 100 and yb < maxTail and yb > minLo * fit_val)
+            or (iBin >= 100 and yb < maxMid and yb > 0.6 * minLo * fit_val)
+        )
+
+        if keep:
+            out[iBin] = yb
+
+        # Spike suppression: drop neighbors if they are inconsistent
+        if 12 < iBin < 90:
+            cur = out[iBin]
+            pr1 = out[iBin - 1]
+            pr2 = out[iBin - 2]
+            if (
+                cur > 1 and pr1 > 1 and pr2 > 1 and
+                abs(cur - fit_val) / fit_val < 0.2 and
+                abs(pr1 - prev1) / prev1 > 0.25 and
+                abs(pr1 - cur) / pr1 > 0.25 and
+                abs(pr1 - pr2) / pr2 > 0.25 and
+                abs(pr2 - prev2) / prev2 < 0.2
+            ):
+                out[iBin - 1] = 0
+
+        prev2, prev1 = prev1, fit_val
+
+    return out
+
+def process_sl(iSL, histFileName, output_dir, fits, secParams):
+    # Layer-level filtering, plots and CSV export for one SuperLayer.
+    # Runs in a worker process: the ROOT file is reopened here, and the sector
+    # fits arrive as (formula, params, xmin, xmax) and per-sector parameter arrays.
+    histFile = ROOT.TFile.Open(histFileName, "READ")
+
+    # --- Load 2D histograms and detailed layer wire distributions ---
+    avgWire = []
+    readHistSandSL(histFile, 'avgWire', avgWire)
+
+    layVScomp_SL_L, layVScomp_SL_R = [], []
+    readHistSandSL(histFile, 'layVScomp_leftSL', layVScomp_SL_L)
+    readHistSandSL(histFile, 'layVScomp_rightSL', layVScomp_SL_R)
+
+    layersSLS = []
+    readSLS(histFile, 'wireINlayer', layersSLS)
+
+    # --- Containers for fits and filtered results ---
+    g1_lay, g2_lay, g3_lay, g4_lay = [], [], [], []
+    histDiffSecLay = []
+
+    # One TF1 per fit piece, only for drawing
+    plotFuncs = [ROOT.TF1(f'g{i + 1}_SL{iSL}', formula, xmin, xmax)
+                 for i, (formula, _, xmin, xmax) in enumerate(fits)]
 
     for sec in range(6):
         c2 = ROOT.TCanvas("c2", "c2", 1900, 600)
         c2.Divide(4, 2, 0.0001, 0.0001)
         c2.Draw()
 
-        g1_lay[iSL].append([]); g2_lay[iSL].append([]); g3_lay[iSL].append([]); g4_lay[iSL].append([])
-        histDiffSecLay[iSL].append([])
+        g1_lay.append([]); g2_lay.append([]); g3_lay.append([]); g4_lay.append([])
+        histDiffSecLay.append([])
+
+        sectorInt = avgWire[sec][iSL].Integral(startG1fit[iSL], maxWireFit)
 
         for lay in range(6):
             h = layersSLS[sec][iSL][lay]
@@ -342,72 +299,27 @@ for iSL in range(6):
             h.SetTitle(f'Wires, S {sec + 1}, SupLay {iSL + 1}, Abs. Lay {iSL * 6 + lay + 1}')
 
             diff_name = f'histDiffSecLaySL{iSL}S{sec}_lay{lay}'
-            h_diff = ROOT.TH1D(diff_name, diff_name, h.GetNbinsX(), h.GetXaxis().GetXmin(), h.GetXaxis().GetXmax())
-            histDiffSecLay[iSL][sec].append(h_diff)
+            xaxis = h.GetXaxis()
+            h_diff = ROOT.TH1D(diff_name, diff_name, xaxis.GetNbins(), xaxis.GetXmin(), xaxis.GetXmax())
+            histDiffSecLay[sec].append(h_diff)
 
             # Normalize to sector-level fits
-            sectorInt = avgWire[sec][iSL].Integral(startG1fit[iSL], maxWireFit)
             layInt = h.Integral(startG1fit[iSL], maxWireFit)
             norm = layInt / sectorInt if sectorInt > 0 else 0
 
-            g1 = fit_clone(g1_sec[iSL][sec], "g1")
-            g2 = fit_clone(g2_sec[iSL][sec], "g2")
-            g3 = fit_clone(g3_sec[iSL][sec], "g3")
-            g4 = fit_clone(g4_sec[iSL][sec], "g4")
-
-            for f in [g1, g2, g3, g4]:
-                for i in range(f.GetNpar()):
-                    f.SetParameter(i, f.GetParameter(i) * norm)
+            g1, g2, g3, g4 = (p * norm for p in secParams[sec])
 
-            g1_lay[iSL][sec].append(g1)
-            g2_lay[iSL][sec].append(g2)
-            g3_lay[iSL][sec].append(g3)
-            g4_lay[iSL][sec].append(g4)
+            g1_lay[sec].append(g1)
+            g2_lay[sec].append(g2)
+            g3_lay[sec].append(g3)
+            g4_lay[sec].append(g4)
 
             # Bin-by-bin filtering
-            prev1, prev2 = 0, 0
-            for iBin in range(1, h.GetNbinsX() + 1):
-                x = h.GetBinCenter(iBin)
-                y = h.GetBinContent(iBin)
-
-                # Select function by wire range
-                fit_val = 0
-                if x <= startG2fit[iSL]:
-                    fit_val = GetPol3_value(x, *[g1.GetParameter(i) for i in range(4)])
-                elif x <= startG3fit[iSL]:
-                    fit_val = GetPol3_value(x, *[g2.GetParameter(i) for i in range(4)])
-                elif x <= startG4fit[iSL]:
-                    fit_val = GetPol3_value(x, *[g3.GetParameter(i) for i in range(4)])
-                else:
-                    fit_val = GetPol1hyperb_value(x, *[g4.GetParameter(i) for i in range(3)])
-
-                keep = (
-
-                    ( iBin < 12 and y < maxBorderLay * fit_val and y > minBorderLay * fit_val ) or iBin < 4 or iBin > 105
-                   or ( iBin >= 12 and iBin < 75 and y < 2.0 * maxBorderLay * fit_val and y >  minBorderLay_Mid * fit_val)
-                   or ( iBin >= 75 and iBin < 100 and y < (2.0 * maxBorderLay * fit_val  or iBin > 98) and y > 1.0 * minBorderLay * fit_val  )
-                   or ( iBin >= 100 and y < 2.0 * maxBorderLay * fit_val and y > 0.6 * minBorderLay * fit_val )
-                )
-
-                if keep:
-                    h_diff.SetBinContent(iBin, y)
-
-                # Spike suppression: drop neighbors if they are inconsistent
-                if 12 < iBin < 90:
-                    cur = h_diff.GetBinContent(iBin)
-                    pr1 = h_diff.GetBinContent(iBin - 1)
-                    pr2 = h_diff.GetBinContent(iBin - 2)
-                    if (
-                        cur > 1 and pr1 > 1 and pr2 > 1 and
-                        abs(cur - fit_val) / fit_val < 0.2 and
-                        abs(pr1 - prev1) / prev1 > 0.25 and
-                        abs(pr1 - cur) / pr1 > 0.25 and
-                        abs(pr1 - pr2) / pr2 > 0.25 and
-                        abs(pr2 - prev2) / prev2 < 0.2
-                    ):
-                        h_diff.SetBinContent(iBin - 1, 0)
-
-                prev2, prev1 = prev1, fit_val
+            x, y = th1_arrays(h)
+            th1_view(h_diff)[:] = filter_layer(x, y, g1, g2, g3, g4,
+                                               startG2fit[iSL], startG3fit[iSL], startG4fit[iSL],
+                                               minBorderLay, minBorderLay_Mid, maxBorderLay)
+            h_diff.ResetStats()
 
             # Plot
             h.SetFillColor(2)
@@ -415,10 +327,8 @@ for iSL in range(6):
             h.Draw()
             h_diff.SetFillColor(9)
             h_diff.Draw("same")
-            g1.Draw("same")
-            g2.Draw("same")
-            g3.Draw("same")
-            g4.Draw("same")
+            for g, p in zip(plotFuncs, (g1, g2, g3, g4)):
+                draw_fit(g, p)
 
         # LayVSComp 2D Plots
         for idx, side in enumerate([layVScomp_SL_L, layVScomp_SL_R], start=7):
@@ -430,31 +340,239 @@ for iSL in range(6):
                 ROOT.gPad.SetLogz()
             h2d.Draw("COLZ")
 
-        out_dir = f'{output_dir}/results/SL{iSL + 1}'
-        ensure_dir(out_dir)
-        c2.Print(f'{out_dir}/sec{sec + 1}.png', "png")
+        c2.Print(f'{output_dir}/results/SL{iSL + 1}/sec{sec + 1}.png', "png")
 
     # Export filtered wires to CSV by sector
     for sec in range(6):
-        SL_vals, Layer_vals, Sector_vals, Wire_vals = [], [], [], []
+        Layer_vals, Wire_vals = [], []
         for lay in range(6):
-            h = histDiffSecLay[iSL][sec][lay]
-            for iXbin in range(5, h.GetNbinsX() + 1):
-                wire = h.GetBinCenter(iXbin)
-                val = h.GetBinContent(iXbin)
-                if val <= 1 and 5 < wire < 106:
-                    SL_vals.append(iSL + 1)
-                    Layer_vals.append(lay + 1)
-                    Sector_vals.append(sec + 1)
-                    Wire_vals.append(wire)
-
-        if SL_vals:
+            wire, val = th1_arrays(histDiffSecLay[sec][lay])
+            bad = (val <= 1) & (wire > 5) & (wire < 106)
+            Wire_vals.append(wire[bad])
+            Layer_vals.append(np.full(np.count_nonzero(bad), lay + 1, dtype=np.int32))
+
+        wires = np.concatenate(Wire_vals)
+        if len(wires):
             df = pd.DataFrame({
-                "Super Layer": SL_vals,
-                "Sector": Sector_vals,
-                "Layer": Layer_vals,
-                "Wire": Wire_vals
+                "Super Layer": iSL + 1,
+                "Sector": sec + 1,
+                "Layer": np.concatenate(Layer_vals),
+                "Wire": wires.astype(np.int32)
             })
-            out_dir = f'{output_dir}/results/SL{iSL + 1}'
-            ensure_dir(out_dir)
-            df.to_csv(f'{out_dir}/BWsec{sec + 1}.csv', index=False)
+            df.to_csv(f'{output_dir}/results/SL{iSL + 1}/BWsec{sec + 1}.csv', index=False)
+
+    histFile.Close()
+
+def main(input_path, base_output_dir, sl_workers=6):
+    # Full GetStatus pass over one ROOT file; importable so a driver can run
+    # many files in one interpreter instead of starting python per file.
+    # sl_workers processes filter the six SuperLayers; a driver that already runs
+    # files in parallel passes 1, which filters them in this process, so the two
+    # levels of parallelism don't multiply
+
+    # Open input file
+    histFileData = ROOT.TFile.Open(input_path, "READ")
+
+    # Prepare structured output folder
+    output_dir = prepare_output_folder(input_path, base_output_dir)
+
+    # Drop the stamp of an earlier pass: the CSVs are deleted below, so until this
+    # pass completes the run must not count as up to date
+    stamp = completion_stamp(input_path, base_output_dir)
+    try:
+        os.remove(stamp)
+    except FileNotFoundError:
+        pass
+
+    ####################################################################
+
+    # Create every output folder once, up front
+    for sub_dir in ['plots', 'SupLayers'] + [f'results/SL{iSL + 1}' for iSL in range(6)]:
+        ensure_dir(f'{output_dir}/{sub_dir}')
+
+    for iSL in range(6):
+      out_dir = f'{output_dir}/results/SL{iSL + 1}'
+
+      # Delete all CSV files in the folder
+      with os.scandir(out_dir) as entries:
+          csv_files = [e.path for e in entries if e.name.endswith('.csv')]
+      for file_path in csv_files:
+          try:
+              os.remove(file_path)
+              print(f"Deleted old file: {file_path}")
+          except OSError as e:
+              print(f"Error deleting {file_path}: {e}")
+
+    ####################################################################
+
+    # Load and plot avgWireSummed histograms
+    aveWireSum = []
+    readHistS(histFileData, 'avgWireSummed', aveWireSum, suffix='_SL')
+
+    canvas = ROOT.TCanvas("c2", "c2", 2500, 1200)
+    canvas.Divide(3, 2, 0.0001, 0.0001)
+
+    for iS, hist in enumerate(aveWireSum):
+        canvas.cd(iS + 1)
+        # Force minimum content for bins > 109
+        tail = th1_view(hist)[110:-1]
+        np.maximum(tail, 10, out=tail)
+        hist.ResetStats()
+        setHistParam1D(hist, color=4)
+        hist.SetTitle(f'         Sum All Sec, SupLay {iS + 1}')
+        hist.Draw()
+
+    canvas.Print(f"{output_dir}/plots/avgWireSum.png", 'png')
+
+    # Load and plot avgWire histograms for each sector & superlayer
+    avgWire = []
+    readHistSandSL(histFileData, 'avgWire', avgWire)
+
+    # --- Containers ---
+    histDiff = []
+    fitsSL = []
+    g1_sec, g2_sec, g3_sec, g4_sec = [], [], [], []
+
+    # --- Fit and filter wires by SuperLayer ---
+    for iSL in range(6):
+        c2 = ROOT.TCanvas(f"c2_{iSL}", "Canvas", 2500, 1000)
+        c2.Divide(4, 2, 0.0001, 0.0001)
+        histDiff.append([])
+
+        # Sum histogram and fitting
+        histSum = aveWireSum[iSL]
+        c2.cd(8)
+        setHistParam1D(histSum, 115)
+        histSum.SetTitle(f'     avgWire Sum, SupLay {iSL + 1}')
+
+        g1 = ROOT.TF1("g1", "pol3", startG1fit[iSL], endG1fit[iSL])
+        g2 = ROOT.TF1("g2", "pol3", startG2fit[iSL], endG2fit[iSL])
+        g3 = ROOT.TF1("g3", "pol3", startG3fit[iSL], endG3fit[iSL])
+        g4 = ROOT.TF1("g4", "[0] + [1]*x + [2]/x", startG4fit[iSL], maxWireFit)
+
+        x, y = th1_arrays(histSum)
+        g1.SetParameters(fit_pol3(x, y, startG1fit[iSL], endG1fit[iSL]))
+        g2.SetParameters(fit_pol3(x, y, startG2fit[iSL], endG2fit[iSL]))
+        g3.SetParameters(fit_pol3(x, y, startG3fit[iSL], endG3fit[iSL]))
+        g4.SetParameters(fit_pol1hyperb(x, y, startG4fit[iSL], maxWireFit))
+        for g in (g1, g2, g3, g4):
+            attach_fit(histSum, g)
+
+        # Fit results as plain parameter arrays; g1..g4 are only used for drawing below
+        fitsSL.append([fit_params(g) for g in (g1, g2, g3, g4)])
+
+        # Per sector fits
+        g1_sec.append([]); g2_sec.append([]); g3_sec.append([]); g4_sec.append([])
+
+        histSum.Draw()
+
+        fit_integral = histSum.Integral(startG1fit[iSL], maxWireFit)
+
+        for sec in range(6):
+            pad = sec + 1 if sec < 3 else sec + 2
+            c2.cd(pad)
+
+            hist = avgWire[sec][iSL]
+            fullName = f'fitDiffS{sec}_SL{iSL}'
+            xaxis = hist.GetXaxis()
+            hdiff = ROOT.TH1D(fullName, fullName, xaxis.GetNbins(), xaxis.GetXmin(), xaxis.GetXmax())
+            histDiff[-1].append(hdiff)
+
+            setHistParam1D(hist, 4)
+            hist.SetTitle(f'          avgWire Sec {sec + 1}, SupLay {iSL + 1}')
+
+
+
+            hist_integral = hist.Integral(startG1fit[iSL], maxWireFit)
+            norm = hist_integral / fit_integral if fit_integral > 0 else 0
+
+
+
+            p1, p2, p3, p4 = (params * norm for _, params, _, _ in fitsSL[iSL])
+
+            g1_sec[-1].append(p1)
+            g2_sec[-1].append(p2)
+            g3_sec[-1].append(p3)
+            g4_sec[-1].append(p4)
+
+            # Filter wires against the piecewise sector fit
+            x, y = th1_arrays(hist)
+            fit_val = piecewise_fit(x, (endG1fit[iSL], endG2fit[iSL], endG3fit[iSL]), p1, p2, p3, p4)
+            keep = ((minBorder * fit_val < y) & (y < maxBorder * fit_val) & (x >= 15) & (x < 107)) | (x < 15) | (x >= 107)
+
+            th1_view(hdiff)[1:-1] = np.where(keep, y, 0)
+            hdiff.ResetStats()
+
+            # Draw
+            hist.SetFillColor(2)
+            hist.SetAxisRange(0, 115, 'x')
+            hist.Draw()
+
+            histDiff[-1][-1].SetFillColor(9)
+            histDiff[-1][-1].Draw("same")
+
+            for g, p in zip((g1, g2, g3, g4), (p1, p2, p3, p4)):
+                draw_fit(g, p)
+
+
+        filename = f"{output_dir}/SupLayers/SLnew{iSL + 1}.png"
+        c2.Print(filename)
+
+        #c2.Print(f'{output_dir}/SupLayers/SLnew{iSL + 1}.png')
+
+
+
+
+
+
+    ####################################################################
+
+
+
+    # Overlay plots and save integrated view per SuperLayer
+    canvas = ROOT.TCanvas("c2", "c2", 2000, 600)
+    canvas.Divide(3, 2, 0.0001, 0.0001)
+    for iSL in range(6):
+        canvas.cd(iSL + 1)
+        hist = aveWireSum[iSL]
+        setHistParam1D(hist, 9)
+        hist.SetLineWidth(3)
+        hist.SetAxisRange(0, 114, 'x')
+        hist.Draw()
+
+    canvas.Print(f"{output_dir}/plots/avgWireInt.png")
+
+    # Compile filter_layer once here rather than inside the first iteration,
+    # so the forked workers inherit the compiled version
+    filter_layer(np.zeros(1), np.zeros(1, dtype=np.float32), np.zeros(4), np.zeros(4), np.zeros(4), np.zeros(3),
+                 0, 0, 0, minBorderLay, minBorderLay_Mid, maxBorderLay)
+
+    # --- Main filtering loop: SuperLayers are independent, up to sl_workers processes ---
+    secParamsSL = [list(zip(g1_sec[iSL], g2_sec[iSL], g3_sec[iSL], g4_sec[iSL])) for iSL in range(6)]
+    if sl_workers <= 1:
+        # Serial, in this process: no extra fork and no second ROOT process
+        for iSL in range(6):
+            process_sl(iSL, input_path, output_dir, fitsSL[iSL], secParamsSL[iSL])
+    else:
+        with ProcessPoolExecutor(max_workers=sl_workers, mp_context=multiprocessing.get_context('fork')) as executor:
+            jobs = [executor.submit(process_sl, iSL, input_path, output_dir, fitsSL[iSL], secParamsSL[iSL])
+                    for iSL in range(6)]
+            for job in jobs:
+                job.result()
+
+    histFileData.Close()
+
+    # Every job returned without raising: mark the pass complete
+    with open(stamp, 'w'):
+        pass
+
+
+if __name__ == "__main__":
+    # Argument parsing
+    parser = argparse.ArgumentParser(description="ROOT histogram processing")
+    parser.add_argument("--input", required=True, help="Path to the input ROOT file")
+    parser.add_argument("--output", required=True, help="Output directory for plots and CSVs")
+    parser.add_argument("--sl-workers", type=int, default=6, help="Processes filtering the SuperLayers in parallel")
+    args = parser.parse_args()
+
+    main(args.input, args.output, args.sl_workers)
@@ -19,9 +19,11 @@ from __future__ import annotations
 import argparse
 from pathlib import Path
 import sys
+import numpy as np
 import pandas as pd
-import ROOT
 
+# ROOT is imported inside the drawing helpers only: loading it is slow and
+# the table-building path does not need it
 
 
 SECTIONS = range(1, 7)       # 1..6
@@ -46,14 +48,6 @@ def read_section_files(sl_dir: Path) -> list[pd.DataFrame]:
     return dfs
 
 
-def normalize_wire_column(df: pd.DataFrame) -> pd.DataFrame:
-    """Downcast 'Wire' column to int if it exists."""
-    if "Wire" in df.columns:
-        df = df.copy()
-        df["Wire"] = pd.to_numeric(df["Wire"], errors="coerce").astype("Int64")
-    return df
-
-
 def build_superlayer_outputs(base_dir: Path, out_dir: Path) -> tuple[int, int]:
     """
     For each superlayer SLk, read BWsec1..6.csv, concat, write BW_SLk.dat.
@@ -69,12 +63,11 @@ def build_superlayer_outputs(base_dir: Path, out_dir: Path) -> tuple[int, int]:
         dfs = read_section_files(sl_dir)
         # Count rows per section like original code
         num_bw = sum(df.shape[0] for df in dfs)
-        # Concatenate
-        result = pd.concat(dfs, axis=0, ignore_index=True)
-        result = normalize_wire_column(result)
+        # Concatenate; every column is an integer (Wire may be stored as e.g. 17.0)
+        result = np.concatenate([df.to_numpy() for df in dfs]).astype(np.int32)
 
         out_file = out_dir / f"BW_SL{sl}.dat"
-        result.to_csv(out_file, index=False)
+        np.savetxt(out_file, result, fmt="%d", delimiter=",", header=",".join(dfs[0].columns), comments="")
 
         print(f"[SL{sl}] rows={result.shape[0]} (sum-of-sections={num_bw}) -> {out_file}")
         total_rows += result.shape[0]
@@ -90,10 +83,17 @@ def build_total(out_dir: Path) -> pd.DataFrame:
         if not f.exists():
             raise FileNotFoundError(f"Expected file not found: {f}")
 
-    dfs = [pd.read_csv(f) for f in per_sl_files]
-    df_total = pd.concat(dfs, axis=0, ignore_index=True)
-    (out_dir / "BW_total.dat").write_text(df_total.to_csv(index=False))
-    print(f"[TOTAL] rows={df_total.shape[0]} -> {out_dir / 'BW_total.dat'}")
+    # All per-SL files share the same header: copy the first one whole and
+    # append only the data rows of the others
+    total_file = out_dir / "BW_total.dat"
+    with open(total_file, "wb") as out:
+        for i, f in enumerate(per_sl_files):
+            data = f.read_bytes()
+            out.write(data if i == 0 else data.split(b"\n", 1)[1])
+
+    # Parsed once, for the CCDB conversion
+    df_total = pd.read_csv(total_file)
+    print(f"[TOTAL] rows={df_total.shape[0]} -> {total_file}")
     return df_total
 
 
@@ -127,15 +127,12 @@ def to_ccdb_only_bw(df_total: pd.DataFrame, out_dir: Path) -> pd.DataFrame:
 
 def full_grid(out_dir: Path, n_sec=6, n_lay=N_LAYERS, n_comp=N_COMPONENTS) -> pd.DataFrame:
     """Build the full sector/layer/component grid with status0=0."""
-    sec = pd.Series(
-        sum(([s] * (n_lay * n_comp) for s in range(1, n_sec + 1)), [])
-    )
-
-    lay = pd.Series(list(range(1, n_lay + 1)) * n_sec * n_comp)
-    comp = pd.Series(list(range(1, n_comp + 1)) * (n_lay * n_sec))
-    df = pd.DataFrame({"sector": sec, "layer": lay.astype(int), "component": comp.astype(int)})
-    df["status0"] = 0
-  
+    # Sector-major, then layer, then component
+    sec = np.repeat(np.arange(1, n_sec + 1, dtype=np.int32), n_lay * n_comp)
+    lay = np.tile(np.repeat(np.arange(1, n_lay + 1, dtype=np.int32), n_comp), n_sec)
+    comp = np.tile(np.arange(1, n_comp + 1, dtype=np.int32), n_sec * n_lay)
+    df = pd.DataFrame({"sector": sec, "layer": lay, "component": comp, "status0": np.zeros_like(sec)})
+
     out_file = out_dir / "BW_empty.dat"
     df.to_csv(out_file, sep=" ", index=False)
   
@@ -148,29 +145,35 @@ def make_grid_merge(df_ccdb_only: pd.DataFrame, out_dir: Path) -> pd.DataFrame:
     filling missing with 0; write BW_ccdb.dat (space-separated).
     """
     df_grid = full_grid(out_dir)
-    bw = df_ccdb_only.rename(columns={"status": "status1"})
 
-    merged = pd.merge(df_grid, bw,  how='left', left_on=["sector","layer", 'component'], right_on = ["sector","layer", 'component'])
-    merged = merged.fillna(0)
-  
-    merged["status"] = (merged["status0"] + merged["status1"]).astype("int32")
+    # The grid is dense (sector-major, then layer, then component), so each
+    # bad wire maps straight to a cell of a (sector, layer, component) array
+    status = np.zeros((6, N_LAYERS, N_COMPONENTS), dtype=np.int32)
+    s = df_ccdb_only["sector"].to_numpy() - 1
+    l = df_ccdb_only["layer"].to_numpy() - 1
+    c = df_ccdb_only["component"].to_numpy() - 1
+    # Rows outside the grid are dropped, as the left merge on the grid did
+    inside = (s >= 0) & (s < 6) & (l >= 0) & (l < N_LAYERS) & (c >= 0) & (c < N_COMPONENTS)
+    status[s[inside], l[inside], c[inside]] = df_ccdb_only["status"].to_numpy()[inside]
+
+    merged = df_grid[["sector", "layer", "component"]].assign(status=status.reshape(-1))
 
     out_file = out_dir / "BW_ccdb.dat"
-    merged[["sector", "layer", "component", "status"]].to_csv(out_file, sep=" ", index=False)
+    np.savetxt(out_file, merged.to_numpy(), fmt="%d", header="sector layer component status", comments="")
     print(f"[Grid merge] rows={merged.shape[0]} -> {out_file}")
     return merged
 
 
-def parse_args() -> argparse.Namespace:
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
   
     p = argparse.ArgumentParser(description="Assemble bad-wire tables and CCDB exports.")
     p.add_argument("--base-dir", type=Path, default=Path("."), help="Directory containing SL1..SL6 subfolders.")
     p.add_argument("--out-dir", type=Path, default=Path("."), help="Directory to write outputs.")
-    p.add_argument("--make-grid", default=True, action="store_true", help="Also generate BW_ccdb.dat merged with full grid.")
-    p.add_argument("--draw-grid", default=True, action="store_true", help="Draw 2x3 grid (one pad per sector).")
+    p.add_argument("--make-grid", default=True, action=argparse.BooleanOptionalAction, help="Also generate BW_ccdb.dat merged with full grid.")
+    p.add_argument("--draw-grid", default=True, action=argparse.BooleanOptionalAction, help="Draw 2x3 grid (one pad per sector).")
     p.add_argument("--plot-out", type=Path, default=None, help="Output image filename for the 2x3 plot.")
 
-    return p.parse_args()
+    return p.parse_args(argv)
 
 
 ############## Drawing: #####################
@@ -178,6 +181,8 @@ def parse_args() -> argparse.Namespace:
 
 
 def set_margins_titles_size(h):
+    import ROOT
+
     h.GetXaxis().SetTitleSize(0.12)
     h.GetXaxis().SetLabelSize(0.07)
     h.GetYaxis().SetTitleOffset(0.3)
@@ -226,7 +231,9 @@ def draw_grid_2x3(
     n_components: int = 112,
     n_layers: int = 36,
 ):
-    # Batch mode if no display
+    import ROOT
+
+    # Batch mode: plots are only written to files
     ROOT.gROOT.SetBatch(True)
 
     df1 = read_ccdb_table(file1)
@@ -243,16 +250,26 @@ def draw_grid_2x3(
     color = 1
     if (df2 is None):
       color = 3
-    for _, r in df1.iterrows():
-        s, lay, comp = int(r["sector"]), int(r["layer"]), int(r["component"])
-        if 1 <= s <= 6:
-            hists[s - 1].Fill(comp, lay, color)
-
-    if df2 is not None:
-        for _, r in df2.iterrows():
-            s, lay, comp = int(r["sector"]), int(r["layer"]), int(r["component"])
-            if 1 <= s <= 6:
-                hists[s - 1].Fill(comp, lay, 2)
+    tables = [(df1, color)] if df2 is None else [(df1, color), (df2, 2)]
+    tables = [(dict(tuple(df.groupby("sector"))), weight) for df, weight in tables]
+
+    # Bin edges matching the TH2D axes: component c -> x bin c, layer l -> y bin l
+    x_edges = np.arange(0.5, n_components + 2)
+    y_edges = np.arange(0.5, n_layers + 2)
+    for sec, h in enumerate(hists, start=1):
+        # TH2D content layout: cell = binx + (nx + 2) * biny, under/overflow included
+        content = np.zeros((n_layers + 3, n_components + 3))
+        n_filled = 0
+        for groups, weight in tables:
+            sub = groups.get(sec)
+            if sub is None:
+                continue
+            counts, _, _ = np.histogram2d(sub["component"].to_numpy(dtype=float), sub["layer"].to_numpy(dtype=float),
+                                          bins=[x_edges, y_edges])
+            content[1:-1, 1:-1] += weight * counts.T
+            n_filled += len(sub)
+        h.SetContent(content.ravel())
+        h.SetEntries(n_filled)
 
     # Canvas
     c = ROOT.TCanvas("c_bw", "Bad-wire occupancy", 1400, 900)
@@ -283,8 +300,8 @@ def draw_grid_2x3(
 
 
 
-def main() -> int:
-    args = parse_args()
+def main(argv: list[str] | None = None) -> int:
+    args = parse_args(argv)
 
     try:
         total_rows, running_sum = build_superlayer_outputs(args.base_dir, args.out_dir)
@@ -300,7 +317,6 @@ def main() -> int:
         # ---- 2x3 plotting (optional) ----
         
         if args.draw_grid:
-            import ROOT  # ensure ROOT is imported when plotting is requested
             ccdb_file = args.out_dir / "BW_only_ccdb.dat"
             if not ccdb_file.exists():
                 raise FileNotFoundError(f"Cannot draw: missing {ccdb_file}")
@@ -0,0 +1,34 @@
+#!/usr/bin/env python3
+"""
+Run GetTable and CreatePDF on one results folder in a single interpreter.
+
+Equivalent to
+  python GetTable.py --base-dir <run>/results --out-dir <run>
+  python CreatePDF.py --base-dir <run>/results --output <run>/wire_distrib.pdf
+but with one interpreter start and one set of imports per run.
+"""
+
+import argparse
+from pathlib import Path
+
+import CreatePDF
+import GetTable
+
+
+def main(argv=None) -> int:
+    p = argparse.ArgumentParser(description="Build the bad-wire tables and the wire PDF for one run.")
+    p.add_argument("--base-dir", type=Path, required=True, help="Directory containing SL1..SL6 subfolders.")
+    p.add_argument("--out-dir", type=Path, required=True, help="Directory to write the tables to.")
+    p.add_argument("--output", type=Path, default=None, help="Output PDF file path (default: <out-dir>/wire_distrib.pdf).")
+    args = p.parse_args(argv)
+
+    output_pdf = args.output if args.output is not None else args.out_dir / "wire_distrib.pdf"
+
+    # The PDF only needs the plots, so it is made even if the tables failed
+    status = GetTable.main(["--base-dir", str(args.base_dir), "--out-dir", str(args.out_dir)])
+    CreatePDF.main(["--base-dir", str(args.base_dir), "--output", str(output_pdf)])
+    return status
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -1,60 +1,148 @@
+import argparse
+import asyncio
+import multiprocessing
+import os
+import resource
 import subprocess
-from pathlib import Path
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
-# Folder containing your .root files
-input_folder = Path("/lustre24/expphy/volatile/clas12/valerii/DC_stat")
+from GetStatus import completion_stamp, main as get_status
 
 
+async def _run_commands(cmds, jobs):
+    sem = asyncio.Semaphore(jobs)
+    failed = asyncio.Event()
 
-#################### STEP 3 from README ####################
+    async def run_one(cmd):
+        async with sem:
+            if failed.is_set():
+                return
+            print("Running:", " ".join(cmd))
+            # Python opens its fds non-inheritable, so there is nothing to close in the
+            # child; with close_fds=False and an absolute executable the child is
+            # started with posix_spawn instead of fork + a close() per possible fd
+            proc = await asyncio.create_subprocess_exec(*cmd, close_fds=False)
+            if await proc.wait() != 0:
+                failed.set()
+                raise subprocess.CalledProcessError(proc.returncode, cmd)
 
-# Get all .root files in the folder
-root_files = sorted(input_folder.glob("*.root"))
+    tasks = []
+    for cmd in cmds:
+        tasks.append(asyncio.create_task(run_one(cmd)))
+        # Let the new task spawn its process before the next command is produced
+        await asyncio.sleep(0)
 
-for root_file in root_files:
-    cmd = [
-        "python3",
-        "GetStatus.py",
-        "--input", str(root_file),
-        "--output", str(input_folder)
-    ]
-    print("Running:", " ".join(cmd))
-    subprocess.run(cmd, check=True)
+    # Commands already running are waited for; the first failure is re-raised
+    for result in await asyncio.gather(*tasks, return_exceptions=True):
+        if isinstance(result, BaseException):
+            raise result
 
-#################### STEP 4 from README ####################
 
-# Find all */results/ folders
-base_path = Path("/lustre24/expphy/volatile/clas12/valerii/DC_stat")
-results_dirs = sorted(base_path.glob("*/results/"))
+def run_commands(cmds, jobs):
+    # Keep `jobs` child processes running from one event loop. cmds may be a
+    # generator: each command is launched as soon as it is produced, overlapping
+    # the launches with whatever enumeration feeds it. After a failure
+    # (like check=True) no new command is started.
+    asyncio.run(_run_commands(cmds, jobs))
 
-for results_dir in results_dirs:
-    # The parent folder (e.g., 020139) will be used for --out-dir
-    parent_dir = results_dir.parent
 
-    cmd = [
-        "python",
-        "GetTable.py",
-        "--base-dir", str(results_dir),
-        "--out-dir", str(parent_dir)
-    ]
-    print("Running:", " ".join(cmd))
+def is_up_to_date(root_file, input_mtime, output_base):
+    # The last GetStatus pass completed after the input was written: one stat
+    try:
+        return os.stat(completion_stamp(root_file, output_base)).st_mtime >= input_mtime
+    except FileNotFoundError:
+        return False
 
 
-#################### STEP 5 from README ####################
+def iter_root_files(folder, force=False):
+    # Yield the .root files in folder as the listing streams in, so jobs can start
+    # before the whole directory is read; each file is independent, no sort needed.
+    # Unless force is set, files whose outputs are already up to date are skipped.
+    with os.scandir(folder) as it:
+        for e in it:
+            if e.name.endswith(".root") and e.is_file():
+                if not force and is_up_to_date(e.path, e.stat().st_mtime, folder):
+                    print("Up to date, skipping:", e.path)
+                    continue
+                yield e.path
 
-# Find all */results/ folders
-results_dirs = sorted(base_path.glob("*/results/"))
 
-for results_dir in results_dirs:
-    # The parent folder (e.g., 020139) will be used to build the output file path
-    parent_dir = results_dir.parent
-    output_pdf = parent_dir / "wire_distrib.pdf"
+def run_get_status(root_file, output_base):
+    # Runs in a pool worker, so the log line appears when the pass really starts.
+    # Files are the parallel unit, so the SuperLayers are filtered serially
+    print("Running: GetStatus", root_file, flush=True)
+    get_status(root_file, output_base, sl_workers=1)
 
-    cmd = [
-        "python",
-        "CreatePDF.py",
-        "--base-dir", str(results_dir),
-        "--output", str(output_pdf)
-    ]
-    print("Running:", " ".join(cmd))
-    subprocess.run(cmd, check=True)
\ No newline at end of file
+
+def list_run_jobs(base):
+    # Sorted (results_dir, run_dir, output_pdf) for every <run>/results folder under
+    # base, like glob("*/results/"); the derived paths are built once, here
+    with os.scandir(base) as it:
+        run_dirs = [e.path for e in it if e.is_dir()]
+    jobs = []
+    for run_dir in run_dirs:
+        results_dir = os.path.join(run_dir, "results")
+        if os.path.isdir(results_dir):
+            jobs.append((results_dir, run_dir, os.path.join(run_dir, "wire_distrib.pdf")))
+    return sorted(jobs)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run GetStatus, GetTable and CreatePDF over all runs")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count(), help="Number of runs processed in parallel")
+    parser.add_argument("--force", action="store_true", help="Rerun GetStatus even for runs whose outputs are up to date")
+    args = parser.parse_args()
+
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    print(f"RLIMIT_NOFILE: soft={soft} hard={hard}")
+
+    # Folder containing your .root files; paths stay plain str, they only end up
+    # as arguments
+    input_folder = "/lustre24/expphy/volatile/clas12/valerii/DC_stat"
+
+
+
+    #################### STEP 3 from README ####################
+
+    # GetStatus runs in-process: the forkserver imports it (and ROOT) once and every
+    # worker is forked from it, instead of starting python3 for each file. At most
+    # --jobs passes run at once
+    ctx = multiprocessing.get_context("forkserver")
+    ctx.set_forkserver_preload(["GetStatus"])
+    with ProcessPoolExecutor(max_workers=args.jobs, mp_context=ctx) as executor:
+        # One task per file (each is a full ROOT pass, batching would only idle
+        # workers), submitted while the folder is still being listed
+        futures = [executor.submit(run_get_status, root_file, input_folder)
+                   for root_file in iter_root_files(input_folder, args.force)]
+        # Like run_commands: the first failure cancels the files not started yet
+        for future in as_completed(futures):
+            try:
+                future.result()
+            except Exception:
+                for pending in futures:
+                    pending.cancel()
+                raise
+
+    # Find all */results/ folders once for Steps 4 and 5
+    base_path = "/lustre24/expphy/volatile/clas12/valerii/DC_stat"
+    jobs = list_run_jobs(base_path)
+
+    #################### STEPS 4 and 5 from README ####################
+
+    # GetTableAndPDF runs GetTable and CreatePDF for one run in one interpreter
+    cmds = []
+    # The parent folder (e.g., 020139) is used for --out-dir and holds the PDF
+    for results_dir, parent_dir, output_pdf in jobs:
+        cmds.append([
+            sys.executable,
+            "GetTableAndPDF.py",
+            "--base-dir", results_dir,
+            "--out-dir", parent_dir,
+            "--output", output_pdf
+        ])
+    run_commands(cmds, args.jobs)
+
+
+if __name__ == "__main__":
+    main()
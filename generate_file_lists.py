@@ -1,10 +1,76 @@
 import os
 import sys
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
-def ensure_dir(path):
-    """Create directory if it doesn't exist."""
-    if not os.path.exists(path):
-        os.makedirs(path)
+# Tuple so further suffixes (e.g. ".hipo.lz4") can be added without another check
+_HIPO = (".hipo",)
+
+# Most buffers one writev() call accepts; sysconf gives -1 when the limit is
+# indeterminate, so keep a sane floor and fall back to the usual Linux value
+try:
+    _IOV_MAX = max(os.sysconf("SC_IOV_MAX"), 16)
+except (ValueError, OSError):
+    _IOV_MAX = 1024
+
+def scan_folder(folder):
+    """
+    Return (subfolders, hipo_paths) of one folder, as full paths from os.scandir.
+    Symlinked subfolders are left out, like os.walk does by default.
+    """
+    subfolders, hipo_paths = [], []
+    # Local names for the per-entry calls in the loop below
+    add_folder, add_hipo, hipo = subfolders.append, hipo_paths.append, _HIPO
+    with os.scandir(folder) as it:
+        for entry in it:
+            if entry.is_dir():
+                if not entry.is_symlink():
+                    add_folder(entry.path)
+            elif entry.name.endswith(hipo):
+                add_hipo(entry.path)
+    return subfolders, hipo_paths
+
+def walk_hipo(root):
+    """
+    Yield (folder, hipo_paths) for every folder under root holding .hipo files.
+    Unreadable folders are skipped, like os.walk does.
+    """
+    stack = [root]
+    while stack:
+        folder = stack.pop()
+        try:
+            subfolders, hipo_paths = scan_folder(folder)
+        except OSError:
+            continue
+        stack.extend(subfolders)
+        if hipo_paths:
+            yield folder, hipo_paths
+
+def write_hipo_list(root, abs_paths, base_path, output_dir):
+    """Write the .hipo paths of one folder to run_paths/<rel_path>.txt; return that file."""
+    rel_path = os.path.relpath(root, base_path).replace(os.sep, "_")
+    if rel_path == ".":
+        rel_path = "root"
+
+    output_file = os.path.join(output_dir, f"{rel_path}.txt")
+    # One gathered writev() per _IOV_MAX paths straight on the fd, no text-layer buffering
+    bufs = [os.fsencode(p) + b"\n" for p in abs_paths]
+    fd = os.open(output_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    try:
+        for i in range(0, len(bufs), _IOV_MAX):
+            batch = bufs[i:i + _IOV_MAX]
+            written = os.writev(fd, batch)
+            if written < sum(map(len, batch)):
+                rest = b"".join(batch)[written:]
+                while rest:
+                    rest = rest[os.write(fd, rest):]
+    finally:
+        os.close(fd)
+    return output_file
+
+def write_subtree_lists(tree, base_path, output_dir):
+    """Write the lists for every folder under tree; return [(n_paths, output_file), ...]."""
+    return [(len(abs_paths), write_hipo_list(root, abs_paths, base_path, output_dir))
+            for root, abs_paths in walk_hipo(tree)]
 
 def generate_hipo_lists(base_path):
     base_path = os.path.abspath(base_path)
@@ -13,25 +79,20 @@ def generate_hipo_lists(base_path):
         return
 
     output_dir = os.path.join(os.getcwd(), "run_paths")
-    ensure_dir(output_dir)
-
-    for root, _, files in os.walk(base_path):
-        # Filter only .hipo files
-        hipo_files = [f for f in files if f.endswith(".hipo")]
-        if not hipo_files:
-            continue  # Skip folders without .hipo files
-
-        abs_paths = [os.path.join(root, f) for f in hipo_files]
-        rel_path = os.path.relpath(root, base_path).replace(os.sep, "_")
-        if rel_path == ".":
-            rel_path = "root"
+    os.makedirs(output_dir, exist_ok=True)
 
-        output_file = os.path.join(output_dir, f"{rel_path}.txt")
-        with open(output_file, "w") as f:
-            for path in abs_paths:
-                f.write(f"{path}\n")
+    subfolders, top_paths = scan_folder(base_path)
+    if top_paths:
+        output_file = write_hipo_list(base_path, top_paths, base_path, output_dir)
+        print(f"✅ Saved {len(top_paths)} .hipo paths to {output_file}")
 
-        print(f"✅ Saved {len(abs_paths)} .hipo paths to {output_file}")
+    # Run folders are independent and each maps to its own output files, so walk
+    # them in parallel; scandir releases the GIL while waiting on the filesystem
+    with ThreadPoolExecutor(max_workers=16) as executor:
+        futures = [executor.submit(write_subtree_lists, tree, base_path, output_dir) for tree in subfolders]
+        for future in as_completed(futures):
+            for n_paths, output_file in future.result():
+                print(f"✅ Saved {n_paths} .hipo paths to {output_file}")
 
 if __name__ == "__main__":
     if len(sys.argv) < 2: